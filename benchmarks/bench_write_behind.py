@@ -0,0 +1,90 @@
+# 写合并 vs 每请求提交 的吞吐对比（文件型 SQLite，每次提交都会真实落盘）
+# 用法：python benchmarks/bench_write_behind.py [写操作数] [并发线程数]
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from models import Base, VerificationCode
+from write_behind import WriteCoalescer
+
+
+def _make_engine(path):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False, "timeout": 60})
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+
+def _insert(i):
+    return lambda session: session.add(VerificationCode(email=f"{i}@example.com", code="000000"))
+
+
+# 每个请求单独开事务并提交（当前默认的写法）
+def bench_per_request_commit(engine, count, workers):
+    def handle(i):
+        with Session(engine) as session:
+            _insert(i)(session)
+            session.commit()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(handle, range(count)))
+    return time.perf_counter() - started
+
+
+# 请求只把写操作交给写合并器，计时到全部写操作落库为止
+def bench_write_behind(engine, count, workers):
+    coalescer = WriteCoalescer(engine, flush_interval_ms=20, max_batch_size=100)
+    coalescer.start()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        writes = list(pool.map(lambda i: coalescer.submit(("email", i), _insert(i)), range(count)))
+    coalescer.close()
+    elapsed = time.perf_counter() - started
+
+    assert all(write.done.is_set() and write.error is None for write in writes)
+    return elapsed
+
+
+# 请求等待自己所在批次提交完成（wait=True，标签和验证码接口的写法）
+def bench_group_commit_wait(engine, count, workers):
+    coalescer = WriteCoalescer(engine, flush_interval_ms=20, max_batch_size=100)
+    coalescer.start()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda i: coalescer.submit(("email", i), _insert(i), wait=True), range(count)))
+    elapsed = time.perf_counter() - started
+    coalescer.close()
+    return elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for name, bench in (("per-request commit", bench_per_request_commit), ("write-behind", bench_write_behind),
+                            ("group commit (wait)", bench_group_commit_wait)):
+            engine = _make_engine(os.path.join(tmp, f"{bench.__name__}.db"))
+            elapsed = bench(engine, count, workers)
+            with Session(engine) as session:
+                assert session.query(VerificationCode).count() == count
+            engine.dispose()
+            results[name] = elapsed
+            print(f"{name:<20} {count} writes in {elapsed:.3f}s  ({count / elapsed:,.0f} writes/s)")
+
+    for name in ("write-behind", "group commit (wait)"):
+        print(f"{name} speedup: {results['per-request commit'] / results[name]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
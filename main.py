@@ -1,5 +1,6 @@
 import json
 import logging
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 from typing import List
 
@@ -9,6 +10,7 @@ from fastapi_cdn_host import monkey_patch_for_docs_ui
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from starlette import status
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.cors import CORSMiddleware
 
 from models import User, VerificationCode, pwd_context, Collection, WebsiteImageStore
@@ -18,9 +20,19 @@ from email_validator import validate_email, EmailNotValidError
 from routers.tags import router as tags_router
 from routers.user import router as user_router  # 导入 User.py 中的路由
 from routers.articles import router as articles_router  # 导入 User.py 中的路由
+from write_behind import WRITE_BEHIND_ENABLED, write_coalescer, submit_write, sync_writes
 # Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+# 写合并器随应用启动，关闭时把缓冲区中的写操作全部落库
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WRITE_BEHIND_ENABLED:
+        write_coalescer.start(engine)
+    yield
+    if WRITE_BEHIND_ENABLED:
+        await run_in_threadpool(write_coalescer.close)
+
+app = FastAPI(lifespan=lifespan)
 monkey_patch_for_docs_ui(app)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
@@ -71,6 +83,11 @@ class CollectionCreate(BaseModel):
     list: List[int]
     token: str
 
+# 保存新的验证码，同时删除该邮箱的旧验证码，由调用方提交
+def _save_verification_code(db: Session, email: str, code: str):
+    db.query(VerificationCode).filter(VerificationCode.email == email).delete(synchronize_session=False)
+    db.add(VerificationCode(email=email, code=code))
+
 @app.post("/send-verification-code")
 def send_verification_code(request: SendCodeRequest, db: Session = Depends(get_db)):
     try:
@@ -79,20 +96,14 @@ def send_verification_code(request: SendCodeRequest, db: Session = Depends(get_d
     except EmailNotValidError:
         raise HTTPException(status_code=400, detail="Invalid email address")
 
-    # 检查该邮箱是否已有旧验证码，如果有则删除
-    old_code = db.query(VerificationCode).filter(VerificationCode.email == email).first()
-    if old_code:
-        db.delete(old_code)
-        db.commit()
-
     code = generate_verification_code()
     send_email(email, code)
 
-    # 保存新的验证码到数据库
-    verification_code = VerificationCode(email=email, code=code)
-    db.add(verification_code)
-    db.commit()
-    db.refresh(verification_code)
+    if WRITE_BEHIND_ENABLED:
+        submit_write(("email", email), lambda session: _save_verification_code(session, email, code), wait=True)
+    else:
+        _save_verification_code(db, email, code)
+        db.commit()
 
     return {"message": "Verification code sent successfully"}
 
@@ -105,6 +116,9 @@ def register(request: RegisterRequest, db: Session = Depends(get_db)):
     except EmailNotValidError:
         raise HTTPException(status_code=400, detail="Invalid email address")
 
+    if WRITE_BEHIND_ENABLED:
+        sync_writes(("email", email))
+
     # 检查验证码是否存在且未过期（有效期 10 分钟）
     ten_minutes_ago = datetime.utcnow() - timedelta(minutes=10)
     verification_code = db.query(VerificationCode).filter(
@@ -162,6 +176,8 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
 
 @app.get("/protected")
 def protected_route(current_user: str = Depends(get_current_user),db: Session = Depends(get_db)):
+    if WRITE_BEHIND_ENABLED:
+        sync_writes(("user", current_user), owner=current_user)
     user = db.query(User).filter(User.username == current_user).first()
     if not user:
         raise HTTPException(
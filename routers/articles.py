@@ -1,9 +1,12 @@
 # routers/articles.py
+from datetime import datetime
+from typing import List, Optional
+
 from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, raiseload
 from models import Article, User
 from database import get_db
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 router = APIRouter()
 
@@ -14,6 +17,18 @@ class ArticleCreate(BaseModel):
     content: str
     title: str
 
+# 文章列表的返回模型，只包含 articles 表自身的列，不会拉取 User 整行
+class ArticleListItem(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    title: Optional[str] = None
+    author_id: Optional[int] = None
+    author_name: Optional[str] = None
+    author_avatar: Optional[str] = None
+    content: Optional[str] = None
+    create_date: Optional[datetime] = None
+
 # 提交文章的接口
 @router.post("/articles/")
 def create_article(article_data: ArticleCreate, db: Session = Depends(get_db)):
@@ -34,15 +49,25 @@ def create_article(article_data: ArticleCreate, db: Session = Depends(get_db)):
     return article
 
 # 获取所有文章的接口
-@router.get("/articles/")
+@router.get("/articles/", response_model=List[ArticleListItem])
 def get_articles(db: Session = Depends(get_db)):
-    articles = db.query(Article).all()
+    # 只查询列表需要的列，作者信息使用冗余字段 author_name / author_avatar
+    articles = db.query(
+        Article.id,
+        Article.title,
+        Article.author_id,
+        Article.author_name,
+        Article.author_avatar,
+        Article.content,
+        Article.create_date
+    ).all()
     return articles
 
 # 根据文章 ID 获取单个文章的接口
 @router.get("/articles/{article_id}")
 def get_article_by_id(article_id: int, db: Session = Depends(get_db)):
-    article = db.query(Article).filter(Article.id == article_id).first()
+    # 禁止懒加载 author，序列化时意外访问会直接报错而不是多发一条查询
+    article = db.query(Article).options(raiseload(Article.author)).filter(Article.id == article_id).first()
     if not article:
         raise HTTPException(status_code=404, detail="Article not found")
     return article
\ No newline at end of file
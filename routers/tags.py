@@ -1,10 +1,11 @@
 # routers/tags.py
 from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload, raiseload
 from models import WebsiteImageStore, Tag, ImageTagAssociation
 from database import get_db
 from pydantic import BaseModel
 from typing import List
+from write_behind import WRITE_BEHIND_ENABLED, submit_write, sync_writes
 
 router = APIRouter()
 
@@ -12,36 +13,49 @@ router = APIRouter()
 class AddTagsRequest(BaseModel):
     tag_names: List[str]
 
-# 为图片添加标签
-@router.post("/images/{image_id}/tags")
-def add_tags_to_image(image_id: int, request: AddTagsRequest, db: Session = Depends(get_db)):
-    image = db.query(WebsiteImageStore).filter(WebsiteImageStore.id == image_id).first()
-    if not image:
-        raise HTTPException(status_code=404, detail="Image not found")
-
-    for tag_name in request.tag_names:
+# 在给定 session 中为图片添加标签，只 flush 不提交，由调用方决定何时提交
+def _add_tags(db: Session, image_id: int, tag_names: List[str]):
+    for tag_name in tag_names:
         tag = db.query(Tag).filter(Tag.name == tag_name).first()
         if not tag:
             tag = Tag(name=tag_name)
             db.add(tag)
-            db.commit()
-            db.refresh(tag)
+            db.flush()
 
         association = db.query(ImageTagAssociation).filter(
             ImageTagAssociation.image_id == image_id,
             ImageTagAssociation.tag_id == tag.id
         ).first()
         if not association:
-            association = ImageTagAssociation(image_id=image_id, tag_id=tag.id)
-            db.add(association)
-            db.commit()
+            db.add(ImageTagAssociation(image_id=image_id, tag_id=tag.id))
+            db.flush()
+
+# 为图片添加标签
+@router.post("/images/{image_id}/tags")
+def add_tags_to_image(image_id: int, request: AddTagsRequest, db: Session = Depends(get_db)):
+    image = db.query(WebsiteImageStore).filter(WebsiteImageStore.id == image_id).first()
+    if not image:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    if WRITE_BEHIND_ENABLED:
+        tag_names = list(request.tag_names)
+        submit_write(("image", image_id), lambda session: _add_tags(session, image_id, tag_names), wait=True)
+    else:
+        _add_tags(db, image_id, request.tag_names)
+        db.commit()
 
     return {"message": "Tags added successfully"}
 
 # 获取图片的所有标签
 @router.get("/images/{image_id}/tags")
 def get_tags_for_image(image_id: int, db: Session = Depends(get_db)):
-    image = db.query(WebsiteImageStore).filter(WebsiteImageStore.id == image_id).first()
+    if WRITE_BEHIND_ENABLED:
+        sync_writes(("image", image_id))
+    # 在同一条查询里 join 出 tags，其余关系一律 raiseload，避免隐式的懒加载查询
+    image = db.query(WebsiteImageStore).options(
+        joinedload(WebsiteImageStore.tags).raiseload("*"),
+        raiseload("*")
+    ).filter(WebsiteImageStore.id == image_id).first()
     if not image:
         raise HTTPException(status_code=404, detail="Image not found")
 
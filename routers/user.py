@@ -1,13 +1,15 @@
 import logging
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from starlette import status
 
 from models import User
-from database import get_db
+from database import get_db, engine
+from tasks import author_snapshot_jobs, create_author_snapshot_job, refresh_author_snapshot
 from utils import verify_token
+from write_behind import WRITE_BEHIND_ENABLED, submit_write
 from fastapi.security import OAuth2PasswordBearer
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
@@ -29,8 +31,8 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
 
 # 上传头像的 API 端点
 @router.post("/upload-avatar")
-def upload_avatar(request: UploadAvatarRequest, current_user: str = Depends(get_current_user),
-                  db: Session = Depends(get_db)):
+def upload_avatar(request: UploadAvatarRequest, background_tasks: BackgroundTasks,
+                  current_user: str = Depends(get_current_user), db: Session = Depends(get_db)):
     logging.info(f"Uploading avatar for user: {current_user}")
     user = db.query(User).filter(User.username == current_user).first()
     if not user:
@@ -38,7 +40,37 @@ def upload_avatar(request: UploadAvatarRequest, current_user: str = Depends(get_
             status_code=status.HTTP_404_NOT_FOUND,
             detail='1111'
         )
-    user.avatar = request.avatar_url
-    db.commit()
-    db.refresh(user)
-    return {"message": "Avatar uploaded successfully"}
+    pending_write = None
+    if WRITE_BEHIND_ENABLED:
+        user_id = user.id
+        avatar_url = request.avatar_url
+        pending_write = submit_write(
+            ("user", current_user),
+            lambda session: session.query(User).filter(User.id == user_id).update({User.avatar: avatar_url}),
+            owner=current_user
+        )
+    else:
+        user.avatar = request.avatar_url
+        db.commit()
+        db.refresh(user)
+
+    # 异步刷新该用户文章中冗余的作者头像，文章读取无需 join users
+    # 开启写合并时，任务会先等头像写入落库，才能读到新头像
+    job_id = create_author_snapshot_job(user.id)
+    background_tasks.add_task(refresh_author_snapshot, job_id, engine, pending_write=pending_write)
+    return {"message": "Avatar uploaded successfully", "job_id": job_id}
+
+
+# 查询作者快照刷新任务的进度
+@router.get("/snapshot-jobs/{job_id}")
+def get_snapshot_job(job_id: str, current_user: str = Depends(get_current_user),
+                     db: Session = Depends(get_db)):
+    user = db.query(User).filter(User.username == current_user).first()
+    job = author_snapshot_jobs.get(job_id)
+    # 只能查询自己的任务，其他用户的任务一律按不存在处理
+    if not job or not user or job["user_id"] != user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return job
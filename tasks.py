@@ -0,0 +1,116 @@
+import logging
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from models import Article, User
+
+# 每批更新的文章数量
+AUTHOR_SNAPSHOT_BATCH_SIZE = 500
+# 已结束的任务保留多久后清理
+AUTHOR_SNAPSHOT_JOB_TTL = timedelta(hours=1)
+# 未结束（pending / running）的任务从创建起保留多久，超时视为已丢失（例如进程在任务执行前崩溃）
+AUTHOR_SNAPSHOT_UNFINISHED_JOB_TTL = timedelta(hours=6)
+# 最多保留的任务数，超出时按创建时间清理，优先清理已结束的任务
+AUTHOR_SNAPSHOT_MAX_JOBS = 1000
+
+# 作者快照刷新任务的进度，key 为任务 id
+# 注意：进度只保存在当前进程内存中，多 worker 部署时只能在创建任务的 worker 上查到
+author_snapshot_jobs = {}
+
+
+def _is_job_expired(job, now):
+    if job["finished_at"] is not None:
+        return now - job["finished_at"] > AUTHOR_SNAPSHOT_JOB_TTL
+    return now - job["created_at"] > AUTHOR_SNAPSHOT_UNFINISHED_JOB_TTL
+
+
+# 清理过期任务，并为新任务腾出位置，保证任务数不超过上限
+def _prune_author_snapshot_jobs():
+    now = datetime.utcnow()
+    for job in list(author_snapshot_jobs.values()):
+        if _is_job_expired(job, now):
+            author_snapshot_jobs.pop(job["job_id"], None)
+
+    overflow = len(author_snapshot_jobs) - AUTHOR_SNAPSHOT_MAX_JOBS + 1
+    if overflow > 0:
+        oldest = sorted(
+            author_snapshot_jobs.values(),
+            key=lambda job: (job["finished_at"] is None, job["created_at"])
+        )[:overflow]
+        for job in oldest:
+            author_snapshot_jobs.pop(job["job_id"], None)
+
+
+# 创建一个作者快照刷新任务，返回任务 id，实际执行交给 BackgroundTasks
+def create_author_snapshot_job(user_id: int):
+    _prune_author_snapshot_jobs()
+    job_id = uuid.uuid4().hex
+    author_snapshot_jobs[job_id] = {
+        "job_id": job_id,
+        "user_id": user_id,
+        "status": "pending",
+        "total": 0,
+        "updated": 0,
+        "error": None,
+        "created_at": datetime.utcnow(),
+        "finished_at": None
+    }
+    return job_id
+
+
+# 把用户当前的用户名和头像同步到该作者的所有文章（articles.author_name / author_avatar）
+# 按 id 分批更新，每批单独提交，避免长事务锁住整张表
+# 每批都用关联子查询读取 users 表中的最新值，同一用户的多个任务重叠时，后提交的批次也不会写回旧头像
+# pending_write 为写合并器中尚未落库的头像写入，任务会先等它提交，写入丢失时任务标记为 failed
+def refresh_author_snapshot(job_id: str, engine, batch_size: int = AUTHOR_SNAPSHOT_BATCH_SIZE,
+                            pending_write=None):
+    job = author_snapshot_jobs.get(job_id)
+    if job is None:
+        logging.warning(f"Author snapshot job {job_id} was evicted before it ran")
+        return
+    try:
+        if pending_write is not None:
+            pending_write.done.wait()
+            if pending_write.error is not None:
+                raise RuntimeError(f"Pending write for {pending_write.key} failed: {pending_write.error}")
+        job["status"] = "running"
+        with Session(engine) as session:
+            user_id = job["user_id"]
+            if not session.query(User.id).filter(User.id == user_id).first():
+                raise ValueError(f"User {user_id} not found")
+
+            job["total"] = session.query(Article).filter(Article.author_id == user_id).count()
+
+            current_name = select(User.username).where(User.id == Article.author_id).scalar_subquery()
+            current_avatar = select(User.avatar).where(User.id == Article.author_id).scalar_subquery()
+
+            last_id = 0
+            while True:
+                ids = [row.id for row in session.query(Article.id).filter(
+                    Article.author_id == user_id,
+                    Article.id > last_id
+                ).order_by(Article.id).limit(batch_size).all()]
+                if not ids:
+                    break
+
+                session.execute(
+                    update(Article)
+                    .where(Article.id.in_(ids))
+                    .values(author_name=current_name, author_avatar=current_avatar)
+                    .execution_options(synchronize_session=False)
+                )
+                session.commit()
+
+                last_id = ids[-1]
+                job["updated"] += len(ids)
+
+        job["status"] = "finished"
+    except Exception as e:
+        logging.exception(f"Author snapshot job {job_id} failed")
+        job["status"] = "failed"
+        job["error"] = str(e)
+    finally:
+        job["finished_at"] = datetime.utcnow()
@@ -0,0 +1,21 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+
+# 查询预算工具：统计代码块内发出的 SQL 条数，超出预算时直接断言失败
+@contextmanager
+def assert_query_budget(engine, max_queries: int):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    assert len(statements) <= max_queries, (
+        f"Expected at most {max_queries} queries, got {len(statements)}:\n" + "\n".join(statements)
+    )
@@ -0,0 +1,76 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm import Session
+
+from database import get_db
+from models import Article, User, WebsiteImageStore, Tag
+from query_budget import assert_query_budget
+from routers.articles import router as articles_router, get_article_by_id
+from routers.tags import router as tags_router
+
+
+@pytest.fixture
+def seeded(db):
+    user = User(username="alice", email="alice@example.com", avatar="a.png")
+    db.add(user)
+    db.flush()
+    for i in range(3):
+        db.add(Article(author_id=user.id, author_name="alice", author_avatar="a.png",
+                       title=f"title {i}", content=f"content {i}"))
+    image = WebsiteImageStore(id=1, title="image")
+    image.tags = [Tag(id=1, name="miku"), Tag(id=2, name="rin")]
+    db.add(image)
+    db.commit()
+    db.expunge_all()
+    return db
+
+
+# 与 main.py 相同的路由前缀，get_db 指向测试用的 SQLite，查询预算覆盖到响应序列化
+@pytest.fixture
+def client(engine, seeded):
+    app = FastAPI()
+    app.include_router(tags_router, prefix="/tags")
+    app.include_router(articles_router, prefix="/articles")
+
+    def override_get_db():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as client:
+        yield client
+
+
+def test_get_articles_is_single_query(engine, client):
+    with assert_query_budget(engine, 1):
+        response = client.get("/articles/articles/")
+    assert response.status_code == 200
+    articles = response.json()
+    assert len(articles) == 3
+    assert articles[0]["content"] == "content 0"
+    assert articles[0]["author_name"] == "alice"
+    assert "author" not in articles[0]
+
+
+def test_get_article_by_id_is_single_query(engine, client, seeded):
+    article_id = seeded.query(Article.id).first().id
+    with assert_query_budget(engine, 1):
+        response = client.get(f"/articles/articles/{article_id}")
+    assert response.status_code == 200
+    assert response.json()["title"] == "title 0"
+
+
+def test_get_article_by_id_raises_on_author_lazy_load(seeded):
+    article_id = seeded.query(Article.id).first().id
+    article = get_article_by_id(article_id, db=seeded)
+    with pytest.raises(InvalidRequestError):
+        article.author
+
+
+def test_get_tags_for_image_is_single_query(engine, client):
+    with assert_query_budget(engine, 1):
+        response = client.get("/tags/images/1/tags")
+    assert response.status_code == 200
+    assert sorted(response.json()["tags"]) == ["miku", "rin"]
@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+
+import tasks
+from models import Article, User
+from tasks import author_snapshot_jobs, create_author_snapshot_job, refresh_author_snapshot
+
+
+# 任务表是模块级的全局字典，每个测试前后清空，避免测试之间互相影响
+@pytest.fixture(autouse=True)
+def clear_jobs():
+    author_snapshot_jobs.clear()
+    yield
+    author_snapshot_jobs.clear()
+
+
+def _seed(db):
+    alice = User(username="alice", email="alice@example.com", avatar="new.png")
+    bob = User(username="bob", email="bob@example.com", avatar="bob.png")
+    db.add_all([alice, bob])
+    db.flush()
+    for i in range(5):
+        db.add(Article(author_id=alice.id, author_name="alice", author_avatar="old.png", title=f"a{i}"))
+    for i in range(2):
+        db.add(Article(author_id=bob.id, author_name="bob", author_avatar="bob-old.png", title=f"b{i}"))
+    db.commit()
+    return alice, bob
+
+
+def test_refresh_author_snapshot_updates_only_that_author(engine, db):
+    alice, bob = _seed(db)
+    job_id = create_author_snapshot_job(alice.id)
+
+    refresh_author_snapshot(job_id, engine, batch_size=2)
+
+    job = author_snapshot_jobs[job_id]
+    assert job["status"] == "finished"
+    assert job["total"] == 5
+    assert job["updated"] == 5
+    assert job["finished_at"] is not None
+
+    db.expire_all()
+    alice_avatars = {a.author_avatar for a in db.query(Article).filter(Article.author_id == alice.id)}
+    bob_avatars = {a.author_avatar for a in db.query(Article).filter(Article.author_id == bob.id)}
+    assert alice_avatars == {"new.png"}
+    assert bob_avatars == {"bob-old.png"}
+
+
+def test_refresh_author_snapshot_writes_latest_user_values(engine, db):
+    alice, _ = _seed(db)
+    job_id = create_author_snapshot_job(alice.id)
+    commits = []
+
+    # 第一批提交后用户再次修改头像，模拟两个任务重叠，后续批次应写入最新值
+    @event.listens_for(Session, "after_commit")
+    def change_avatar_after_first_batch(session):
+        commits.append(session)
+        if len(commits) == 1:
+            with engine.begin() as conn:
+                conn.execute(update(User).where(User.id == alice.id).values(avatar="newer.png"))
+
+    try:
+        refresh_author_snapshot(job_id, engine, batch_size=2)
+    finally:
+        event.remove(Session, "after_commit", change_avatar_after_first_batch)
+
+    db.expire_all()
+    avatars = [a.author_avatar for a in db.query(Article).filter(Article.author_id == alice.id).order_by(Article.id)]
+    assert avatars == ["new.png", "new.png", "newer.png", "newer.png", "newer.png"]
+
+
+def test_refresh_author_snapshot_user_not_found(engine):
+    job_id = create_author_snapshot_job(12345)
+
+    refresh_author_snapshot(job_id, engine)
+
+    job = author_snapshot_jobs[job_id]
+    assert job["status"] == "failed"
+    assert "not found" in job["error"]
+    assert job["updated"] == 0
+
+
+def test_finished_jobs_are_pruned_after_ttl():
+    old_job_id = create_author_snapshot_job(1)
+    author_snapshot_jobs[old_job_id]["finished_at"] = datetime.utcnow() - tasks.AUTHOR_SNAPSHOT_JOB_TTL - timedelta(seconds=1)
+    running_job_id = create_author_snapshot_job(1)
+
+    create_author_snapshot_job(1)
+
+    assert old_job_id not in author_snapshot_jobs
+    assert running_job_id in author_snapshot_jobs
+
+
+def test_unfinished_jobs_are_pruned_after_ttl():
+    stuck_job_id = create_author_snapshot_job(1)
+    author_snapshot_jobs[stuck_job_id]["created_at"] = (
+        datetime.utcnow() - tasks.AUTHOR_SNAPSHOT_UNFINISHED_JOB_TTL - timedelta(seconds=1)
+    )
+
+    new_job_id = create_author_snapshot_job(1)
+
+    assert stuck_job_id not in author_snapshot_jobs
+    assert new_job_id in author_snapshot_jobs
+
+
+def test_job_count_never_exceeds_cap(monkeypatch):
+    monkeypatch.setattr(tasks, "AUTHOR_SNAPSHOT_MAX_JOBS", 3)
+    job_ids = [create_author_snapshot_job(1) for _ in range(3)]
+    author_snapshot_jobs[job_ids[1]]["finished_at"] = datetime.utcnow()
+
+    create_author_snapshot_job(1)
+    assert len(author_snapshot_jobs) == 3
+    # 优先清理已结束的任务
+    assert job_ids[1] not in author_snapshot_jobs
+
+    # 全部是未结束的任务时，清理最早创建的
+    create_author_snapshot_job(1)
+    assert len(author_snapshot_jobs) == 3
+    assert job_ids[0] not in author_snapshot_jobs
+
+
+def test_evicted_job_is_skipped(engine):
+    job_id = create_author_snapshot_job(1)
+    author_snapshot_jobs.clear()
+
+    refresh_author_snapshot(job_id, engine)
+
+    assert job_id not in author_snapshot_jobs
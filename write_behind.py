@@ -0,0 +1,210 @@
+import logging
+import os
+import threading
+import time
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from starlette import status
+
+# 是否启用写合并（默认关闭，设置环境变量 WRITE_BEHIND_ENABLED=1 开启）
+# 注意：
+# 1. 带 owner（发起写入的用户）提交的写操作在接口返回之后才落库。如果整批提交失败、逐条重试也失败，
+#    这条写入就丢失了，但接口已经返回成功；该用户之后带 owner 调用 sync 的读接口会返回 500，
+#    其他用户不会收到这个错误。失败记录保留 WRITE_BEHIND_FAILURE_TTL_SECONDS 秒，最多 WRITE_BEHIND_MAX_FAILURES 条。
+#    没有 owner 的写操作（例如未登录的接口）由接口自己等待提交结果（wait=True），失败时当场返回 500。
+# 2. 读己之写只在单个进程内成立，缓冲区在各个 worker 进程内存中互不可见。
+#    多 worker（uvicorn --workers N）部署时不要开启，否则其他 worker 上的读请求可能读到旧数据。
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "0") == "1"
+# 最长缓冲时间（毫秒）
+WRITE_BEHIND_FLUSH_INTERVAL_MS = int(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL_MS", "20"))
+# 单个事务最多合并的写操作数
+WRITE_BEHIND_MAX_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_MAX_BATCH_SIZE", "100"))
+# 丢失写入的失败记录保留时长（秒）和最多保留条数
+WRITE_BEHIND_FAILURE_TTL_SECONDS = int(os.getenv("WRITE_BEHIND_FAILURE_TTL_SECONDS", "600"))
+WRITE_BEHIND_MAX_FAILURES = int(os.getenv("WRITE_BEHIND_MAX_FAILURES", "1000"))
+
+
+class WriteBehindError(Exception):
+    pass
+
+
+class PendingWrite:
+    def __init__(self, key, fn, owner=None):
+        self.key = key
+        self.fn = fn
+        self.owner = owner
+        self.created_at = time.monotonic()
+        self.done = threading.Event()
+        self.error = None
+
+
+# 写合并器：把高频的小写操作缓存在内存中，每 N 毫秒或攒够 M 条时在同一个事务里提交（group commit）
+# 每个写操作是一个接收 Session 的函数，key 用来标识它属于哪个用户/资源，供 sync 实现读己之写
+class WriteCoalescer:
+    def __init__(self, engine=None, flush_interval_ms: int = WRITE_BEHIND_FLUSH_INTERVAL_MS,
+                 max_batch_size: int = WRITE_BEHIND_MAX_BATCH_SIZE):
+        self.engine = engine
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._pending = []
+        self._inflight = []
+        # 已丢失的写操作，owner -> (key, 异常, 时间)，该用户下一次 sync 时抛出并清除
+        self._failed = {}
+        self._flush_requested = False
+        self._running = False
+        self._thread = None
+
+    def start(self, engine=None):
+        if engine is not None:
+            self.engine = engine
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="write-coalescer", daemon=True)
+        self._thread.start()
+
+    # 提交一个写操作；合并器未运行（未启动或已关闭）时直接在当前线程提交，失败抛出 WriteBehindError
+    # owner 为发起写入的用户，写入丢失时只有该用户之后的 sync 会收到错误
+    # wait=True 时等待所在批次提交完成（group commit），失败直接抛出 WriteBehindError
+    def submit(self, key, fn, owner=None, wait: bool = False):
+        write = PendingWrite(key, fn, owner)
+        with self._cond:
+            running = self._running
+            if running:
+                self._pending.append(write)
+                self._cond.notify()
+        if not running:
+            self._write([write], record_failures=False)
+        elif wait:
+            write.done.wait()
+        if write.error is not None and (wait or not running):
+            raise WriteBehindError(f"Write for {key} failed: {write.error}")
+        return write
+
+    # 等待某个 key 的所有未落库写操作提交完成，读取前调用即可读到自己刚写入的数据
+    # 只通知后台线程立即提交，不在调用方线程里提交其他请求的写操作
+    # 传入 owner 时，该用户有写入丢失则抛出 WriteBehindError（只报告一次）
+    def sync(self, key, owner=None):
+        with self._cond:
+            waiting = [w for w in self._inflight + self._pending if w.key == key]
+            if waiting:
+                self._flush_requested = True
+                self._cond.notify()
+        for write in waiting:
+            write.done.wait()
+        if owner is None:
+            return
+        with self._cond:
+            self._prune_failures()
+            failure = self._failed.pop(owner, None)
+        if failure is not None:
+            raise WriteBehindError(f"Pending write for {failure[0]} failed: {failure[1]}")
+
+    # 立即把缓冲区中的写操作全部提交
+    def flush(self):
+        with self._flush_lock:
+            while True:
+                with self._cond:
+                    batch = self._pending[:self.max_batch_size]
+                    del self._pending[:self.max_batch_size]
+                    self._inflight = batch
+                    if not self._pending:
+                        self._flush_requested = False
+                if not batch:
+                    return
+                try:
+                    self._write(batch)
+                finally:
+                    with self._cond:
+                        self._inflight = []
+
+    # 停止后台线程并提交剩余的写操作，在应用关闭时调用；之后的 submit 会直接提交
+    def close(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and not self._batch_ready():
+                    timeout = None
+                    if self._pending:
+                        timeout = self._pending[0].created_at + self.flush_interval - time.monotonic()
+                    self._cond.wait(timeout)
+                running = self._running
+            self.flush()
+            if not running:
+                return
+
+    def _batch_ready(self):
+        if not self._pending:
+            return False
+        if self._flush_requested or len(self._pending) >= self.max_batch_size:
+            return True
+        return time.monotonic() >= self._pending[0].created_at + self.flush_interval
+
+    # 以下两个方法需要在持有 self._cond 时调用
+    def _record_failure(self, write, error):
+        self._failed.pop(write.owner, None)
+        self._failed[write.owner] = (write.key, error, time.monotonic())
+        self._prune_failures()
+
+    def _prune_failures(self):
+        expire_before = time.monotonic() - WRITE_BEHIND_FAILURE_TTL_SECONDS
+        # dict 按插入顺序保存，最早的记录在最前面
+        while self._failed:
+            owner, (_, _, failed_at) = next(iter(self._failed.items()))
+            if failed_at >= expire_before and len(self._failed) <= WRITE_BEHIND_MAX_FAILURES:
+                break
+            del self._failed[owner]
+
+    def _write(self, batch, record_failures=True):
+        try:
+            with Session(self.engine) as session:
+                for write in batch:
+                    write.fn(session)
+                session.commit()
+        except Exception:
+            # 整批失败时逐条重试，避免一条坏数据拖累同批的其他写操作
+            logging.exception("Write coalescer batch failed, retrying writes one by one")
+            for write in batch:
+                try:
+                    with Session(self.engine) as session:
+                        write.fn(session)
+                        session.commit()
+                except Exception as e:
+                    logging.exception(f"Write coalescer dropped write for {write.key}")
+                    write.error = e
+                    if record_failures and write.owner is not None:
+                        with self._cond:
+                            self._record_failure(write, e)
+        finally:
+            for write in batch:
+                write.done.set()
+
+
+write_coalescer = WriteCoalescer()
+
+
+# 路由中使用的封装，写入失败时返回 500
+def submit_write(key, fn, owner=None, wait: bool = False):
+    try:
+        return write_coalescer.submit(key, fn, owner=owner, wait=wait)
+    except WriteBehindError as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
+def sync_writes(key, owner=None):
+    try:
+        write_coalescer.sync(key, owner=owner)
+    except WriteBehindError as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))